@@ -1,21 +1,100 @@
+import numpy as np
 import pandas as pd
+from pandas.api.types import infer_dtype
 import os
+import codecs
 import csv
-import re
+import io
+import copy
+import datetime
+import threading
+from collections import OrderedDict
+from typing import IO, Union
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+try:
+    import pyarrow  # noqa: F401
+    _HAS_ARROW = True
+except ImportError:
+    _HAS_ARROW = False
+
+try:
+    import python_calamine  # noqa: F401
+    _HAS_CALAMINE = True
+except ImportError:
+    _HAS_CALAMINE = False
+
+# Số byte đầu file dùng để đoán encoding
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+# BOM -> encoding (UTF-32 đứng trước UTF-16 vì BOM UTF-32 LE bắt đầu bằng BOM UTF-16 LE).
+# Codec 'utf-16'/'utf-32' tự đọc BOM để biết little/big endian và bỏ BOM khỏi dữ liệu
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Encoding luôn được chấp nhận từ charset-normalizer (tên chuẩn theo codecs.lookup)
+_TRUSTED_GUESSES = {
+    'cp1252', 'iso8859-1', 'iso8859-15',
+    'utf-16', 'utf-16-le', 'utf-16-be', 'utf-32', 'utf-32-le', 'utf-32-be',
+}
+
+# Encoding khác (cp932, gb18030...) chỉ được tin khi prefix có đủ số byte non-ASCII.
+# Với file ngắn, charset-normalizer hay đoán nhầm cp1252/latin-1 thành cp1006, cp1125... -> decode sai ký tự
+MIN_SNIFF_NON_ASCII = 16
+
+# Encoding dự phòng khi không đoán được / đoán sai, thử lần lượt.
+# latin-1 decode được mọi byte (cp1252 lỗi với 0x81, 0x8D, 0x8F, 0x90, 0x9D) nên đứng cuối
+FALLBACK_ENCODINGS = ('cp1252', 'latin-1')
+
+# File CSV lớn hơn ngưỡng này (và retain_df=False) sẽ được đọc theo chunk, không giữ toàn bộ DataFrame
+STREAM_THRESHOLD_BYTES = 10 * 1024 * 1024
+
+# Số giá trị đầu cột dùng để check cột text của CSV có lẫn số hay không
+MIXED_TYPE_SAMPLE_SIZE = 1024
 
 # 1. Custom Exception để hứng lỗi Duplicate cụ thể
 class DuplicateColumnError(Exception):
     pass
 
 class DataLoader:
-    def __init__(self, file_path: str, max_size_mb: int = 50):
+    def __init__(self, file_path: Union[str, os.PathLike, IO[bytes]], max_size_mb: int = 50,
+                 chunk_rows: int = 500_000, file_name: str = None, retain_df: bool = True):
+        # file_path có thể là đường dẫn hoặc file-like (vd: SpooledTemporaryFile của file upload).
+        # Với file-like cần truyền file_name để biết định dạng (.csv/.xlsx)
         self.file_path = file_path
+        self._is_path = isinstance(file_path, (str, os.PathLike))
+        self.file_name = file_name or (os.path.basename(file_path) if self._is_path else "")
         self.max_size_mb = max_size_mb
+        self.chunk_rows = chunk_rows
+        # retain_df=False: chỉ cần metadata -> bỏ DataFrame ngay sau khi validate để giải phóng bộ nhớ
+        self.retain_df = retain_df
+        self._reset_read_state()
+
+    def _reset_read_state(self, dtype=None):
+        # Trạng thái của 1 lần đọc; reset mỗi lần validate_and_load để gọi lại trên cùng loader không bị lẫn
         self.df = None
         self.metadata = {}
         self.warnings = []
+        # True khi file được đọc theo chunk (self.df = None, số liệu nằm trong self.metadata)
+        self._streamed = False
+        self._types_seen = {}
+        # True khi CSV được parse bằng engine pyarrow: mỗi cột đã có đúng 1 kiểu
+        self._arrow_parsed = False
+        # True khi đọc CSV: mọi giá trị là text nên cột lẫn số + chữ được nhận ra qua cột string có chứa số
+        self._from_csv = False
+        # dtype caller truyền vào: các cột đã ép kiểu thì không cảnh báo mixed datatype
+        self._dtype = dtype
 
-    def validate_and_load(self, action: str = 'check'):
+    def validate_and_load(self, action: str = 'check', dtype=None, usecols: list = None):
         """
         Main method để load dữ liệu.
         Args:
@@ -23,114 +102,332 @@ class DataLoader:
                 - 'check': (Mặc định) Kiểm tra lỗi, nếu trùng cột -> Raise DuplicateColumnError.
                 - 'rename': Tự động đổi tên (Col, Col.1).
                 - 'keep_first': Giữ cột đầu, bỏ cột trùng phía sau.
+            dtype (type | dict): Kiểu dữ liệu cho Pandas (vd: str hoặc {'col': 'int64'}), bỏ qua bước đoán kiểu.
+                Lưu ý: cột đã chỉ định dtype không bị cảnh báo mixed datatype (dtype=str -> mọi cột).
+            usecols (list): Chỉ đọc các cột này (tên hoặc vị trí).
         Returns:
             dict: Metadata của file (rows, columns, warnings...).
         """
-        if self.df is not None:
-            self._check_mixed_datatypes()
-            self._finalize()
+        # Gọi lại trên cùng loader: bỏ DataFrame, metadata, cảnh báo... của lần đọc trước
+        self._reset_read_state(dtype)
+
         # 1. Kiểm tra File tồn tại và Kích thước
         self._basic_validation()
 
         # 2. Đọc file (Xử lý Encoding & Check Duplicate trong này)
-        self._read_file(action)
+        self._read_file(action, dtype, usecols)
         
         # 3. Kiểm tra Mixed Datatype (Cảnh báo)
         self._check_mixed_datatypes()
 
-        # 4. Hoàn tất (Reset index, check empty rows)
+        # 4. Hoàn tất (check empty rows; read_csv/read_excel đã trả về RangeIndex nên không cần reset index)
         self._finalize()
 
+        return self._build_metadata()
+
+    def _build_metadata(self):
+        rows = self.metadata['rows']
+        column_names = self.metadata['column_names']
+
         return {
-            "file_name": os.path.basename(self.file_path),
+            "file_name": self.file_name,
             "size_readable": self._get_readable_size(),
-            "rows": self.df.shape[0],
-            "columns": self.df.shape[1],
-            "column_names": list(self.df.columns),
+            "rows": rows,
+            "columns": len(column_names),
+            "column_names": column_names,
             "warnings": self.warnings
         }
 
     def _basic_validation(self):
-        if not os.path.exists(self.file_path):
-            raise FileNotFoundError(f"File not found: {self.file_path}")
-        
-        file_size = os.path.getsize(self.file_path)
+        if self._is_path:
+            if not os.path.exists(self.file_path):
+                raise FileNotFoundError(f"File not found: {self.file_path}")
+            file_size = os.path.getsize(self.file_path)
+        else:
+            # File-like: seek tới cuối để lấy kích thước rồi quay về đầu
+            file_size = self.file_path.seek(0, os.SEEK_END)
+            self.file_path.seek(0)
+        self._file_size = file_size
+
         if file_size == 0:
             raise ValueError("File is empty.")
         
         if file_size > self.max_size_mb * 1024 * 1024:
             raise ValueError(f"File too large. Limit is {self.max_size_mb}MB.")
 
-    def _read_file(self, action):
-        ext = self.file_path.split('.')[-1].lower()
+    def _source(self):
+        # Pandas đọc được cả path lẫn file-like; file-like phải tua về đầu trước mỗi lần đọc
+        if not self._is_path:
+            self.file_path.seek(0)
+        return self.file_path
+
+    def _read_file(self, action, dtype=None, usecols=None):
+        ext = self.file_name.split('.')[-1].lower()
 
         if ext == 'csv':
-            self._read_csv(action)
+            self._read_csv(action, dtype, usecols)
         elif ext in ['xlsx', 'xls']:
-            self._read_excel(action)
+            self._read_excel(action, ext, dtype, usecols)
         else:
             raise ValueError("Unsupported file format. Use CSV or Excel.")
 
-    def _read_csv(self, action):
-        # Danh sách encoding phổ biến để thử
-        encodings = ['utf-8', 'latin1', 'cp1252', 'utf-16']
-        
-        for enc in encodings:
+    def _detect_encoding(self):
+        # Đọc một đoạn đầu file (64KB) để đoán encoding, thay vì parse cả file nhiều lần
+        if self._is_path:
+            with open(self.file_path, 'rb') as f:
+                prefix = f.read(ENCODING_SNIFF_BYTES)
+        else:
+            prefix = self._source().read(ENCODING_SNIFF_BYTES)
+
+        # Có BOM thì encoding là chắc chắn, không cần đoán
+        for bom, bom_enc in _BOM_ENCODINGS:
+            if prefix.startswith(bom):
+                return bom_enc
+
+        # Thử utf-8 (strict) trước; byte NUL thường là utf-16/32 không BOM nên để charset-normalizer đoán
+        if b'\x00' not in prefix:
             try:
-                # --- BƯỚC 1: CHECK RAW HEADER (Để pass test case) ---
-                # Chỉ check khi action là 'check'
-                if action == 'check':
-                    with open(self.file_path, 'r', encoding=enc, newline='') as f:
-                        # Dùng csv.reader để xử lý đúng chuẩn CSV (dấu phẩy trong ngoặc kép)
-                        reader = csv.reader(f)
-                        try:
-                            header = next(reader) # Lấy dòng đầu tiên
-                        except StopIteration:
-                            raise ValueError("File is empty (no header).")
-                        
-                        # So sánh độ dài list và set để tìm trùng lặp
-                        if len(header) != len(set(header)):
-                            raise DuplicateColumnError("Duplicate column names detected.")
-
-                # --- BƯỚC 2: LOAD BẰNG PANDAS ---
-                # Pandas mặc định sẽ rename cột trùng thành .1, .2 -> Phù hợp với action='rename'
-                self.df = pd.read_csv(self.file_path, encoding=enc)
+                # final=False để bỏ qua ký tự multi-byte bị cắt ở cuối prefix
+                codecs.getincrementaldecoder('utf-8')().decode(prefix, final=len(prefix) < ENCODING_SNIFF_BYTES)
+                return 'utf-8'
+            except UnicodeDecodeError:
+                pass
 
-                # --- BƯỚC 3: XỬ LÝ KEEP FIRST ---
-                if action == 'keep_first':
-                    # Loại bỏ các cột được Pandas tự động thêm hậu tố .1, .2
-                    # Regex này tìm các cột kết thúc bằng dấu chấm và số (vd: "Name.1")
-                    self.df = self.df.loc[:, ~self.df.columns.str.match(r'.*\.\d+$')]
-                
-                return # Đọc thành công thì thoát hàm
-                
+        # Tin kết quả của charset-normalizer nếu nằm trong danh sách cho phép,
+        # hoặc nếu đoán dựa trên đủ nhiều byte non-ASCII (không phải file ngắn vài ký tự có dấu)
+        if charset_normalizer is not None:
+            best = charset_normalizer.from_bytes(prefix).best()
+            if best is not None:
+                if codecs.lookup(best.encoding).name in _TRUSTED_GUESSES:
+                    return best.encoding
+                # translate xoá các byte ASCII -> phần còn lại là byte non-ASCII
+                if len(prefix.translate(None, bytes(range(0x80)))) >= MIN_SNIFF_NON_ASCII:
+                    return best.encoding
+
+        return FALLBACK_ENCODINGS[0]
+
+    def _read_csv(self, action, dtype=None, usecols=None):
+        self._from_csv = True
+        enc = self._detect_encoding()
+
+        # Encoding đoán từ 64KB đầu có thể sai với phần sau của file -> thử lại lần lượt với cp1252, latin-1
+        tried = []
+        for candidate in (enc,) + FALLBACK_ENCODINGS:
+            if codecs.lookup(candidate).name in tried:
+                continue
+            tried.append(codecs.lookup(candidate).name)
+            try:
+                self._load_csv(action, candidate, dtype, usecols)
+                return
             except UnicodeDecodeError:
-                continue # Thử encoding tiếp theo
-            except DuplicateColumnError as e:
-                raise e # Ném lỗi duplicate ra ngay
-            except Exception as e:
-                # Nếu lỗi không phải do encoding thì báo lỗi luôn
-                if enc == encodings[-1]: 
-                    raise ValueError(f"Error reading CSV: {str(e)}")
-
-        raise ValueError("Encoding error. Could not decode file with common encodings.")
-    
-    def _read_excel(self, action):
+                continue
+
+        raise ValueError(f"Encoding error. Could not decode file as {' or '.join(repr(e) for e in tried)}.")
+
+    def _load_csv(self, action, enc, dtype=None, usecols=None):
+        # --- BƯỚC 1: CHECK RAW HEADER ---
+        # Chỉ đọc dòng header (không parse dữ liệu), check trùng xong mới load bằng Pandas.
+        # Lỗi header / duplicate / encoding được ném thẳng ra, không bọc thành "Error reading CSV"
+        header, skipped_blank = self._read_csv_header(enc)
+
+        # So sánh độ dài list và set để tìm trùng lặp
+        has_duplicate = len(header) != len(set(header))
+        if action == 'check' and has_duplicate:
+            raise DuplicateColumnError("Duplicate column names detected.")
+
         try:
-            # 1. Luôn load dữ liệu lên trước
-            self.df = pd.read_excel(self.file_path)
-            
+            # dtype/usecols do caller truyền vào: bỏ qua bước đoán kiểu / cột không cần
+            read_kwargs = {'encoding': enc}
+            if dtype is not None:
+                read_kwargs['dtype'] = dtype
+            if usecols is not None:
+                read_kwargs['usecols'] = usecols
+
+            if has_duplicate and action == 'keep_first':
+                # --- BƯỚC 3: XỬ LÝ KEEP FIRST ---
+                # Chỉ đọc vị trí xuất hiện đầu tiên của mỗi tên cột, cột trùng không bao giờ được load
+                read_kwargs['usecols'] = self._first_occurrence_cols(header, usecols)
+
+            # Engine C: map file vào bộ nhớ (mmap) thay vì read() từng block.
+            # Chỉ áp dụng cho path; file-like (SpooledTemporaryFile) có thể chưa có file thật trên đĩa
+            if self._is_path:
+                read_kwargs['memory_map'] = True
+
+            # File lớn mà caller không cần DataFrame: đọc theo chunk để giới hạn bộ nhớ, chỉ giữ lại metadata
+            if not self.retain_df and self._file_size > STREAM_THRESHOLD_BYTES:
+                self._stream_csv(read_kwargs)
+                return
+
+            # --- BƯỚC 2: LOAD BẰNG PANDAS ---
+            # Engine pyarrow parse đa luồng, nhưng giữ nguyên tên cột trùng (không rename .1),
+            # không nhận usecols theo vị trí và áp dtype sau khi đã đoán kiểu (vd: "01" -> 1 -> "1")
+            # -> chỉ dùng khi header không trùng, không có dtype, usecols là tên cột.
+            # Pyarrow cũng không bỏ qua dòng chỉ có khoảng trắng trước header như engine C
+            self.df = None
+            if (_HAS_ARROW and not has_duplicate and not skipped_blank and dtype is None
+                    and all(isinstance(c, str) for c in usecols or [])):
+                self.df = self._read_csv_arrow(read_kwargs, enc)
+            # Còn lại (rename) hoặc pyarrow không cho kết quả giống engine C:
+            # Pandas mặc định sẽ rename cột trùng thành .1, .2
+            if self.df is None:
+                self.df = pd.read_csv(self._source(), **read_kwargs)
+
+        except UnicodeDecodeError:
+            raise # Lỗi encoding để _read_csv thử lại
+        except Exception as e:
+            raise ValueError(f"Error reading CSV: {str(e)}")
+
+    def _read_csv_arrow(self, read_kwargs, enc):
+        # Trả về None nếu pyarrow không đọc được hoặc kết quả khác engine C -> caller đọc lại bằng engine C
+        arrow_kwargs = {k: v for k, v in read_kwargs.items() if k != 'memory_map'} # pyarrow không hỗ trợ memory_map
+        try:
+            df = pd.read_csv(self._source(), engine='pyarrow', **arrow_kwargs)
+        except pd.errors.ParserError:
+            # Pyarrow chặt hơn engine C: dòng thiếu cột, dòng chỉ có khoảng trắng giữa dữ liệu...
+            return None
+
+        # Pyarrow không raise khi decode sai mà trả về cột bytes -> coi như lỗi encoding để thử lại
+        for col in df.select_dtypes(include=['object', 'string']).columns:
+            if infer_dtype(df[col], skipna=True) == 'bytes':
+                raise UnicodeDecodeError(enc, b'', 0, 0, f"column '{col}' could not be decoded")
+
+        if not self._matches_c_engine(df):
+            return None
+
+        # Ô header trống: pyarrow để tên '' còn engine C đặt "Unnamed: i" -> đồng bộ với engine C
+        if any(name == '' for name in df.columns):
+            df.columns = [name if name != '' else f"Unnamed: {i}" for i, name in enumerate(df.columns)]
+
+        self._arrow_parsed = True
+        return df
+
+    def _matches_c_engine(self, df):
+        # Pyarrow tự parse ngày/giờ (engine C để nguyên chuỗi) và đổi số nguyên > int64 thành float
+        # (engine C giữ uint64) -> những cột này phải đọc lại bằng engine C
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+                return False
+            if series.dtype == object:
+                # Cột pyarrow chỉ có 1 kiểu -> xem giá trị khác null đầu tiên là đủ
+                first = series.first_valid_index()
+                if first is not None and isinstance(series[first], (datetime.date, datetime.time)):
+                    return False
+            elif pd.api.types.is_float_dtype(series) and (series.abs() >= 2 ** 63).any():
+                return False
+        return True
+
+    def _read_csv_header(self, enc):
+        # Dùng csv.reader để xử lý đúng chuẩn CSV (dấu phẩy trong ngoặc kép).
+        # TextIOWrapper decode theo encoding nên an toàn cả với utf-16 (không tách dòng trên byte thô)
+        # Bỏ qua dòng trống / chỉ có khoảng trắng trước header giống skip_blank_lines của Pandas.
+        # Trả về (header, có bỏ qua dòng trống hay không)
+        if self._is_path:
+            with open(self.file_path, 'r', encoding=enc, newline='') as f:
+                header, skipped_blank = self._first_record(f)
+        else:
+            f = io.TextIOWrapper(self._source(), encoding=enc, newline='')
+            try:
+                header, skipped_blank = self._first_record(f)
+            finally:
+                f.detach() # Không đóng file-like gốc
+
+        if not header:
+            raise ValueError("File is empty (no header).")
+        return header, skipped_blank
+
+    def _first_record(self, f):
+        skipped_blank = False
+        for row in csv.reader(f):
+            if not row or (len(row) == 1 and not row[0].strip()):
+                skipped_blank = True
+                continue
+            return row, skipped_blank
+        return None, skipped_blank
+
+    def _stream_csv(self, read_kwargs):
+        total_rows = 0
+        column_names = None
+        types_seen = {}
+
+        # read_kwargs đã gồm encoding và usecols của keep_first (cột trùng không được đọc)
+        for chunk in pd.read_csv(self._source(), chunksize=self.chunk_rows, **read_kwargs):
+            if column_names is None:
+                column_names = list(chunk.columns)
+            total_rows += len(chunk)
+
+            # Gom loại dữ liệu (numeric/string/mixed...) của từng cột qua các chunk:
+            # cùng 1 cột có thể là int64 ở chunk này nhưng object ở chunk sau
+            for col in chunk.columns:
+                if self._dtype_forced(col):
+                    continue
+                kind = self._column_kind(chunk[col], text_numbers=True)
+                if kind is not None:
+                    types_seen.setdefault(col, set()).add(kind)
+
+        self._streamed = True
+        self._types_seen = types_seen
+        self.metadata['rows'] = total_rows
+        self.metadata['column_names'] = column_names or []
+
+    def _column_kind(self, series, text_numbers=False):
+        # Phân loại 1 cột bằng infer_dtype (Cython); None nếu cột toàn null
+        if not series.notna().any():
+            return None
+        kind = infer_dtype(series, skipna=True)
+        if kind in ('integer', 'floating', 'decimal', 'complex'):
+            return 'numeric'
+        if kind.startswith('mixed'):
+            return 'mixed'
+        # CSV (text_numbers=True): cột lẫn số + chữ được parse thành cột string (cả pyarrow lẫn engine C)
+        # -> check mẫu xem cột string có chứa số không, không phải quét toàn bộ dòng
+        if text_numbers and kind == 'string' and self._sampled_has_numeric(series):
+            return 'mixed'
+        return kind
+
+    def _dtype_forced(self, col):
+        # Cột caller đã chỉ định dtype (dtype=str -> mọi cột) thì không cảnh báo mixed datatype
+        if self._dtype is None:
+            return False
+        return col in self._dtype if isinstance(self._dtype, dict) else True
+
+    def _first_occurrence_cols(self, header, usecols=None):
+        # Vị trí xuất hiện đầu tiên của mỗi tên cột (bỏ cột trùng), giao với usecols nếu có.
+        # Ô header trống (NaN ở Excel, '' ở CSV) không tính là trùng vì Pandas đặt tên "Unnamed: i" riêng cho từng ô
+        blank = [pd.isna(name) or name == '' for name in header]
+        dup_mask = [is_dup and not is_blank
+                    for is_dup, is_blank in zip(pd.Index(header).duplicated(keep='first'), blank)]
+        wanted = set(usecols) if usecols is not None else None
+        return [i for i, (name, is_dup) in enumerate(zip(header, dup_mask))
+                if not is_dup and (wanted is None or i in wanted or name in wanted)]
+
+    def _read_excel(self, action, ext='xlsx', dtype=None, usecols=None):
+        # .xls cũ dùng xlrd; .xlsx ưu tiên calamine (Rust, nhanh hơn openpyxl nhiều lần)
+        if ext == 'xls':
+            engine = 'xlrd'
+        elif _HAS_CALAMINE:
+            engine = 'calamine'
+        else:
+            engine = 'openpyxl'
+
+        try:
+            # 1. Đọc dòng header gốc (header=None) để check trùng trực tiếp,
+            #    không dựa vào hậu tố .1 Pandas tự thêm (cột tên "Name.1" có sẵn không bị nhận nhầm)
+            raw = pd.read_excel(self._source(), sheet_name=0, engine=engine, header=None, nrows=1)
+            header = raw.iloc[0].tolist() if len(raw) else []
+            has_duplicate = len(self._first_occurrence_cols(header)) != len(header)
+
             # 2. Kiểm tra trùng cột nếu action là 'check'
-            # Pandas tự đổi tên trùng thành 'a', 'a.1'. 
-            # Regex này tìm các cột có đuôi .số
-            is_duplicate = self.df.columns.str.match(r'.*\.\d+$').any()
-            
-            if action == 'check' and is_duplicate:
+            if action == 'check' and has_duplicate:
                 raise DuplicateColumnError("Duplicate column names detected.")
-            
-            # 3. Nếu là keep_first, lọc bỏ các cột .1, .2
-            if action == 'keep_first':
-                self.df = self.df.loc[:, ~self.df.columns.str.match(r'.*\.\d+$')]
+
+            # 3. Nếu là keep_first, chỉ đọc vị trí xuất hiện đầu tiên -> cột trùng không bao giờ được load
+            if action == 'keep_first' and has_duplicate:
+                usecols = self._first_occurrence_cols(header, usecols)
+
+            # 4. Load dữ liệu (chỉ sheet đầu tiên, bỏ qua các sheet khác)
+            self.df = pd.read_excel(self._source(), sheet_name=0, engine=engine,
+                                    dtype=dtype, usecols=usecols)
                 
         except DuplicateColumnError:
             raise
@@ -138,26 +435,94 @@ class DataLoader:
             raise ValueError(f"Error reading Excel: {str(e)}")
 
     def _check_mixed_datatypes(self):
+        if self._streamed:
+            for col, kinds in self._types_seen.items():
+                if len(kinds) > 1 or 'mixed' in kinds:
+                    self.warnings.append(f"Column '{col}' has mixed datatypes (e.g., Number and String).")
+            return
         if self.df is None: return
         
-        for col in self.df.columns:
-            # Chỉ check cột object (text)
-            if self.df[col].dtype == 'object':
-                # Bỏ qua null, lấy danh sách các kiểu dữ liệu trong cột
-                types = self.df[col].dropna().apply(type).unique()
-                if len(types) > 1:
-                    self.warnings.append(f"Column '{col}' has mixed datatypes (e.g., Number and String).")
+        # Chỉ check cột object (text); cùng 1 cách phân loại cho mọi đường đọc CSV (pyarrow, engine C, chunk)
+        for col in self.df.select_dtypes(include=['object', 'string']).columns:
+            if self._dtype_forced(col):
+                continue
+            if self._column_kind(self.df[col], text_numbers=self._from_csv) == 'mixed':
+                self.warnings.append(f"Column '{col}' has mixed datatypes (e.g., Number and String).")
+
+    def _sampled_has_numeric(self, series):
+        # Chỉ đếm số hữu hạn: to_numeric cũng đổi "inf"/"Infinity" thành số, nhưng đó thường là text
+        sample = series.iloc[:MIXED_TYPE_SAMPLE_SIZE].dropna()
+        numbers = pd.to_numeric(sample, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        return bool(np.isfinite(numbers).any())
 
     def _finalize(self):
+        if self._streamed:
+            # Không có DataFrame, chỉ check empty rows
+            if self.metadata['rows'] == 0:
+                raise ValueError("Dataset contains no rows.")
+            return
         if self.df is not None:
-            self.df.reset_index(drop=True, inplace=True)
-            if self.df.shape[0] == 0:
+            self.metadata['rows'] = self.df.shape[0]
+            self.metadata['column_names'] = list(self.df.columns)
+            if not self.retain_df:
+                self.df = None
+            if self.metadata['rows'] == 0:
                  raise ValueError("Dataset contains no rows.")
 
     def _get_readable_size(self):
-        size = os.path.getsize(self.file_path)
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.2f} {unit}"
-            size /= 1024
-        return f"{size:.2f} TB"
\ No newline at end of file
+        # Dùng size đã lấy ở _basic_validation; bậc đơn vị = số bit / 10 (1KB = 2^10 B)
+        size = self._file_size
+        i = min((size.bit_length() - 1) // 10, 4) if size else 0
+        return f"{size / (1 << (10 * i)):.2f} {['B', 'KB', 'MB', 'GB', 'TB'][i]}"
+
+
+# Cache metadata theo key (path/size/mtime hoặc hash nội dung), tối đa METADATA_CACHE_SIZE phần tử (LRU)
+METADATA_CACHE_SIZE = 128
+_METADATA_CACHE = OrderedDict()
+# load_metadata được gọi từ threadpool (FastAPI) -> khoá khi đọc/ghi cache, không khoá khi parse file
+_METADATA_CACHE_LOCK = threading.Lock()
+
+
+def load_metadata(file_path: Union[str, os.PathLike, IO[bytes]], action: str = 'check', max_size_mb: int = 50,
+                  content_hash: str = None, file_name: str = None):
+    """
+    Giống DataLoader.validate_and_load nhưng có cache, chỉ trả về metadata (không giữ DataFrame).
+    Cache key là (path, size, mtime) -> file không đổi thì không phải parse lại.
+    Args:
+        content_hash (str): Hash nội dung file (vd: file upload). Nếu có thì dùng thay cho mtime.
+            File-like chỉ được cache khi có content_hash.
+        file_name (str): Tên file, bắt buộc khi file_path là file-like.
+    Returns:
+        dict: Metadata của file (rows, columns, warnings...).
+    """
+    if isinstance(file_path, (str, os.PathLike)):
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File not found: {file_path}")
+        mtime_ns = None if content_hash is not None else st.st_mtime_ns
+        key = (os.path.realpath(file_path), st.st_size, mtime_ns, content_hash, file_name, action, max_size_mb)
+    elif content_hash is not None:
+        key = (None, None, None, content_hash, file_name, action, max_size_mb)
+    else:
+        key = None
+
+    result = None
+    if key is not None:
+        with _METADATA_CACHE_LOCK:
+            result = _METADATA_CACHE.get(key)
+            if result is not None:
+                _METADATA_CACHE.move_to_end(key)
+
+    if result is None:
+        loader = DataLoader(file_path, max_size_mb, file_name=file_name, retain_df=False)
+        result = loader.validate_and_load(action)
+        if key is not None:
+            with _METADATA_CACHE_LOCK:
+                _METADATA_CACHE[key] = result
+                _METADATA_CACHE.move_to_end(key)
+                if len(_METADATA_CACHE) > METADATA_CACHE_SIZE:
+                    _METADATA_CACHE.popitem(last=False)
+
+    # Trả bản copy để caller sửa dict/list không làm hỏng cache
+    return copy.deepcopy(result)
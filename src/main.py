@@ -1,49 +1,79 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-import os
-import shutil
-from src.data_loader import DataLoader, DuplicateColumnError
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import hashlib
+import tempfile
+from src.data_loader import load_metadata, DuplicateColumnError
 
 app = FastAPI(title="Data Validator API")
 
-# Tạo thư mục upload nếu chưa có
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Giới hạn kích thước file upload (giống mặc định của DataLoader)
+MAX_UPLOAD_MB = 50
 
-def remove_file(path: str):
-    if os.path.exists(path):
-        os.remove(path)
+# Đọc file upload theo từng block 1MiB
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# File upload nhỏ hơn ngưỡng này được giữ trong RAM, lớn hơn mới tự ghi ra đĩa
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Phần dư cho boundary/header của multipart: Content-Length là cả body, lớn hơn file một chút
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def reject_large_body(request: Request, call_next):
+    # Starlette parse và spool toàn bộ form trước khi vào endpoint -> phải chặn theo Content-Length ở đây
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > MAX_UPLOAD_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"File too large. Limit is {MAX_UPLOAD_MB}MB."})
+    return await call_next(request)
 
 @app.post("/upload/")
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     action: str = "check"
 ):
-    # 1. Lưu file tạm thời
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Đảm bảo file sẽ được xóa sau khi trả về response
-    background_tasks.add_task(remove_file, file_path)
-
-    try:
-        # 2. Sử dụng DataLoader đã viết
-        loader = DataLoader(file_path)
-        result = loader.validate_and_load(action=action)
-        
-        return {
-            "status": "success",
-            "data": result
-        }
-
-    except DuplicateColumnError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    max_bytes = MAX_UPLOAD_MB * 1024 * 1024
+    too_large = HTTPException(status_code=413, detail=f"File too large. Limit is {MAX_UPLOAD_MB}MB.")
+
+    # 0. Kích thước file do multipart parser ghi nhận (form đã được parse xong).
+    #    Content-Length đã được chặn ở middleware, đây chỉ là lớp kiểm tra thêm
+    if file.size and file.size > max_bytes:
+        raise too_large
+
+    # 1. Chép file upload vào SpooledTemporaryFile (không cần lưu vào thư mục uploads/),
+    #    đồng thời hash nội dung để làm cache key
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        hasher = hashlib.blake2b()
+        written = 0
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            # Content-Length có thể thiếu/sai -> vẫn đếm số byte thực tế đã nhận
+            written += len(chunk)
+            if written > max_bytes:
+                raise too_large
+            hasher.update(chunk)
+            # Spool vượt SPOOL_MAX_BYTES sẽ ghi ra đĩa -> chạy trong threadpool để không chặn event loop
+            await run_in_threadpool(spool.write, chunk)
+        spool.seek(0)
+
+        try:
+            # 2. Sử dụng DataLoader đã viết (có cache: cùng nội dung thì không parse lại)
+            # Parse file (I/O + CPU) cũng chạy trong threadpool
+            result = await run_in_threadpool(load_metadata, spool, action=action, max_size_mb=MAX_UPLOAD_MB,
+                                             content_hash=hasher.hexdigest(), file_name=file.filename)
+
+            return {
+                "status": "success",
+                "data": result
+            }
+
+        except DuplicateColumnError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
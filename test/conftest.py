@@ -0,0 +1,11 @@
+import pytest
+
+from src import data_loader
+
+
+# Cache metadata là biến toàn cục của module -> xóa trước và sau mỗi test để test không phụ thuộc thứ tự chạy
+@pytest.fixture(autouse=True)
+def clear_metadata_cache():
+    data_loader._METADATA_CACHE.clear()
+    yield
+    data_loader._METADATA_CACHE.clear()
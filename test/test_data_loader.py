@@ -1,9 +1,12 @@
+import io
 import os
 import pytest
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
-from src.data_loader import DataLoader, DuplicateColumnError
+from src import data_loader
+from src.data_loader import DataLoader, DuplicateColumnError, load_metadata
 
 
 # =========================
@@ -48,6 +51,21 @@ def test_file_too_large():
     os.unlink(path)
 
 
+@pytest.mark.parametrize("size, expected", [
+    (1, "1.00 B"),
+    (1023, "1023.00 B"),
+    (1024, "1.00 KB"),
+    (1536, "1.50 KB"),
+    (5 * 1024 ** 2, "5.00 MB"),
+    (2048 * 1024 ** 4, "2048.00 TB"),
+])
+def test_readable_size(size, expected):
+    loader = DataLoader("dummy_path.csv")
+    loader._file_size = size
+
+    assert loader._get_readable_size() == expected
+
+
 # =========================
 # CSV DUPLICATE LOGIC
 # =========================
@@ -87,6 +105,41 @@ def test_duplicate_rename_mode():
     os.unlink(path)
 
 
+def test_keep_first_loads_first_occurrence_only():
+    path = create_temp_file("a,b,a,a.1\n1,2,3,4")
+
+    loader = DataLoader(path)
+    result = loader.validate_and_load(action="keep_first")
+
+    # Cột "a.1" có sẵn trong file không phải cột trùng -> vẫn giữ
+    assert result["column_names"] == ["a", "b", "a.1"]
+    assert loader.df["a"].tolist() == [1]
+
+    os.unlink(path)
+
+
+@pytest.mark.parametrize("content", ["\na,b\n1,2\n", "\n  \na,b\n1,2\n"])
+def test_leading_blank_lines_skipped(content):
+    path = create_temp_file(content)
+
+    result = DataLoader(path).validate_and_load()
+
+    assert result["column_names"] == ["a", "b"]
+    assert result["rows"] == 1
+
+    os.unlink(path)
+
+
+def test_blank_lines_only_raises_unwrapped():
+    path = create_temp_file("\n\n")
+
+    loader = DataLoader(path)
+    with pytest.raises(ValueError, match=r"^File is empty \(no header\)\.$"):
+        loader.validate_and_load()
+
+    os.unlink(path)
+
+
 # =========================
 # NORMAL CSV LOAD
 # =========================
@@ -104,6 +157,188 @@ def test_normal_csv_load():
     os.unlink(path)
 
 
+# =========================
+# ENCODING DETECTION
+# =========================
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1252", "utf-16", "utf-8-sig", "utf-32"])
+def test_csv_encoding_detection(encoding):
+    path = create_temp_file("name,city\nAn,Ha Noi\nJosé,Café\n", encoding=encoding)
+
+    loader = DataLoader(path)
+    result = loader.validate_and_load()
+
+    assert result["rows"] == 2
+    assert result["column_names"] == ["name", "city"]
+
+    os.unlink(path)
+
+
+def test_csv_dtype_and_usecols():
+    path = create_temp_file("a,b,c\n1,x,01\n2,y,02")
+
+    loader = DataLoader(path)
+    result = loader.validate_and_load(dtype={"c": str}, usecols=["a", "c"])
+
+    assert result["column_names"] == ["a", "c"]
+    assert loader.df["c"].tolist() == ["01", "02"]
+
+    os.unlink(path)
+
+
+# =========================
+# STREAMED (CHUNKED) CSV LOAD
+# =========================
+
+def test_large_csv_is_streamed(monkeypatch):
+    monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    path = create_temp_file("a,b,a,a.1\n" + "".join(f"{i},x{i},{i},{i}\n" for i in range(5)))
+
+    loader = DataLoader(path, chunk_rows=2, retain_df=False)
+    result = loader.validate_and_load(action="keep_first")
+
+    assert loader.df is None
+    assert result["rows"] == 5
+    assert result["column_names"] == ["a", "b", "a.1"]
+    assert result["warnings"] == []
+
+    os.unlink(path)
+
+
+@pytest.mark.parametrize("text", ["Äpfel", "£5", "œuvre", "José"])
+def test_short_cp1252_file_is_not_misdetected(text):
+    path = create_temp_file(f"a,b\n{text},1\n", encoding="cp1252")
+
+    loader = DataLoader(path)
+    loader.validate_and_load()
+
+    assert loader.df["a"].tolist() == [text]
+
+    os.unlink(path)
+
+
+@pytest.mark.skipif(data_loader.charset_normalizer is None, reason="charset-normalizer not installed")
+def test_cp932_file_keeps_detected_encoding():
+    content = "name,city\n山田太郎,東京\n佐藤花子,大阪\n鈴木一郎,名古屋\n"
+    path = create_temp_file(content, encoding="cp932")
+
+    loader = DataLoader(path)
+    loader.validate_and_load()
+
+    assert loader.df["name"].tolist() == ["山田太郎", "佐藤花子", "鈴木一郎"]
+    assert loader.df["city"].tolist() == ["東京", "大阪", "名古屋"]
+
+    os.unlink(path)
+
+
+def test_byte_undefined_in_cp1252_falls_back_to_latin1():
+    # 0x81 không có trong cp1252 nhưng latin-1 decode được mọi byte
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as f:
+        f.write(b"a,b\n\x81x,1\n")
+        path = f.name
+
+    loader = DataLoader(path)
+    result = loader.validate_and_load()
+
+    assert result["rows"] == 1
+    assert loader.df["a"].tolist() == ["\x81x"]
+
+    os.unlink(path)
+
+
+def test_non_ascii_after_sniff_prefix_retries_cp1252():
+    # Header trùng -> engine C; ký tự "é" nằm sau 64KB đầu nên prefix trông như utf-8
+    content = "a,a\n" + "x,1\n" * 20000 + "é,2\n"
+    path = create_temp_file(content, encoding="cp1252")
+
+    loader = DataLoader(path)
+    result = loader.validate_and_load(action="rename")
+
+    assert result["rows"] == 20001
+    assert loader.df["a"].iloc[-1] == "é"
+
+    os.unlink(path)
+
+
+def test_large_csv_not_streamed_when_df_retained(monkeypatch):
+    monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    path = create_temp_file("a,b\n1,2\n3,4")
+
+    loader = DataLoader(path, chunk_rows=1)
+    result = loader.validate_and_load()
+
+    assert not loader._streamed
+    assert loader.df.shape == (2, 2)
+    assert result["rows"] == 2
+
+    os.unlink(path)
+
+
+def test_streamed_mixed_types_across_chunks(monkeypatch):
+    monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    # Chunk đầu cột "a" là int64, chunk cuối là text; cột "b" có chunk toàn null
+    path = create_temp_file("a,b\n" + "".join(f"{i},{i}.5\n" for i in range(4)) + "hello,\n")
+
+    loader = DataLoader(path, chunk_rows=2, retain_df=False)
+    result = loader.validate_and_load()
+
+    assert loader._streamed
+    assert result["rows"] == 5
+    assert result["warnings"] == ["Column 'a' has mixed datatypes (e.g., Number and String)."]
+
+    os.unlink(path)
+
+
+def test_wrong_guess_past_prefix_without_duplicates():
+    # Header không trùng -> engine pyarrow (nếu có), phải thử lại cp1252 thay vì trả về bytes
+    content = "name,city\n" + "x,y\n" * 20000 + "José,Café\n"
+    path = create_temp_file(content, encoding="cp1252")
+
+    loader = DataLoader(path)
+    loader.validate_and_load()
+
+    assert loader.df.iloc[-1].tolist() == ["José", "Café"]
+
+    os.unlink(path)
+
+
+def test_keep_first_keeps_blank_header_cells():
+    path = create_temp_file("a,,\n1,2,3")
+
+    result = DataLoader(path).validate_and_load(action="keep_first")
+
+    assert result["column_names"] == ["a", "Unnamed: 1", "Unnamed: 2"]
+
+    os.unlink(path)
+
+
+def test_blank_header_cell_named_unnamed():
+    path = create_temp_file("a,,c\n1,2,3")
+
+    result = DataLoader(path).validate_and_load()
+
+    assert result["column_names"] == ["a", "Unnamed: 1", "c"]
+
+    os.unlink(path)
+
+
+@pytest.mark.parametrize("content", [
+    "a,b,c\n1,2,3\n4,5\n",                                         # dòng thiếu cột
+    "a,b\n1,2\n   \n3,4\n",                                        # dòng chỉ có khoảng trắng
+    "id,day,at\n1,2020-01-01,2020-01-01 10:00:00\n2,2020-01-02,\n", # ngày/giờ ISO
+    "id,big\n1,12345678901234567890\n2,1\n",                       # số nguyên > int64
+])
+def test_csv_result_matches_c_engine(content):
+    path = create_temp_file(content)
+
+    loader = DataLoader(path)
+    loader.validate_and_load()
+
+    pd.testing.assert_frame_equal(loader.df, pd.read_csv(path, engine="c"))
+
+    os.unlink(path)
+
+
 # =========================
 # MIXED DATATYPE WARNING
 # =========================
@@ -129,6 +364,61 @@ def test_mixed_datatype_warning():
     
 
 
+def test_mixed_datatype_with_nulls():
+    loader = DataLoader("dummy_path.xlsx")
+    loader.df = pd.DataFrame({
+        "a": [1, None, 2, 3, "hello"],  # Null bị bỏ qua, còn lại lẫn int và str
+        "b": ["x", None, "y", "z", "w"],
+    })
+
+    loader._check_mixed_datatypes()
+
+    assert len(loader.warnings) == 1
+    assert "Column 'a' has mixed datatypes" in loader.warnings[0]
+
+
+@pytest.mark.parametrize("content, kwargs, stream", [
+    ("a,b\n1,x\nhello,y\n", {}, False),                   # pyarrow (nếu có)
+    ("a,b,b\n1,x,x\nhello,y,y\n", {"action": "rename"}, False),  # header trùng -> engine C
+    ("a,b\n1,x\nhello,y\n", {"dtype": {"b": str}}, False),  # có dtype -> engine C
+    ("a,b\n1,x\nhello,y\n", {}, True),                    # đọc theo chunk
+])
+def test_mixed_datatype_warning_same_on_all_csv_paths(monkeypatch, content, kwargs, stream):
+    if stream:
+        monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    path = create_temp_file(content)
+
+    loader = DataLoader(path, retain_df=not stream)
+    result = loader.validate_and_load(**kwargs)
+
+    assert result["warnings"] == ["Column 'a' has mixed datatypes (e.g., Number and String)."]
+
+    os.unlink(path)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_infinity_text_not_counted_as_number(monkeypatch, stream):
+    if stream:
+        monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    path = create_temp_file("name,age\ninf,1\nbob,2\nInfinity,3\n")
+
+    result = DataLoader(path, retain_df=not stream).validate_and_load()
+
+    assert result["warnings"] == []
+
+    os.unlink(path)
+
+
+def test_dtype_str_disables_mixed_warning_on_reused_loader():
+    path = create_temp_file("a,b\n1,x\nhello,y\n")
+
+    loader = DataLoader(path)
+    assert len(loader.validate_and_load()["warnings"]) == 1
+    assert loader.validate_and_load(dtype=str)["warnings"] == []
+
+    os.unlink(path)
+
+
 # =========================
 # DATASET WITH NO ROWS
 # =========================
@@ -157,6 +447,115 @@ def test_unsupported_format():
     os.unlink(path)
 
 
+# =========================
+# METADATA CACHE
+# =========================
+
+def test_load_metadata_cache(monkeypatch):
+    path = create_temp_file("a,b\n1,2\n3,4")
+
+    calls = []
+    original = DataLoader.validate_and_load
+
+    def counting_validate_and_load(self, action="check"):
+        calls.append(action)
+        return original(self, action)
+
+    monkeypatch.setattr(DataLoader, "validate_and_load", counting_validate_and_load)
+
+    first = load_metadata(path)
+    first["warnings"].append("changed by caller")
+
+    second = load_metadata(path)
+    assert len(calls) == 1
+    assert second["rows"] == 2
+    assert second["warnings"] == []
+
+    # File thay đổi (size/mtime khác) -> phải đọc lại
+    with open(path, "a") as f:
+        f.write("\n5,6")
+    assert load_metadata(path)["rows"] == 3
+    assert len(calls) == 2
+
+    os.unlink(path)
+
+
+def test_load_metadata_cache_concurrent(monkeypatch):
+    # Nhiều thread (threadpool của FastAPI) cùng đọc/ghi cache nhỏ -> không được lỗi KeyError
+    monkeypatch.setattr(data_loader, "METADATA_CACHE_SIZE", 2)
+    contents = [f"a,b\n{i},{i}\n".encode() for i in range(4)]
+
+    def worker(i):
+        content = contents[i % len(contents)]
+        return load_metadata(io.BytesIO(content), content_hash=str(i % len(contents)), file_name="x.csv")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(worker, range(200)))
+
+    assert all(r["rows"] == 1 for r in results)
+    assert len(data_loader._METADATA_CACHE) <= 2
+
+
+def test_retain_df_false_drops_dataframe():
+    path = create_temp_file("a,b\n1,2\n3,4")
+
+    loader = DataLoader(path, retain_df=False)
+    result = loader.validate_and_load()
+
+    assert loader.df is None
+    assert result["rows"] == 2
+    assert result["column_names"] == ["a", "b"]
+
+    os.unlink(path)
+
+
+def test_reused_loader_resets_read_state(monkeypatch):
+    path = create_temp_file("a,b\n1,x\nhello,y\n")
+    loader = DataLoader(path, retain_df=False)
+
+    # Lần 1: đọc theo chunk
+    monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 0)
+    loader.validate_and_load()
+    assert loader._streamed
+
+    # Lần 2: file nhỏ hơn ngưỡng -> không còn trạng thái chunk của lần trước
+    monkeypatch.setattr(data_loader, "STREAM_THRESHOLD_BYTES", 10 * 1024 * 1024)
+    result = loader.validate_and_load(dtype=str)
+
+    assert not loader._streamed
+    assert loader._types_seen == {}
+    assert result["warnings"] == []
+    assert result["rows"] == 2
+
+    os.unlink(path)
+
+
+# =========================
+# FILE-LIKE INPUT
+# =========================
+
+def test_file_like_csv_load():
+    buffer = io.BytesIO(b"a,b\n1,2\n3,4")
+
+    loader = DataLoader(buffer, file_name="upload.csv")
+    result = loader.validate_and_load()
+
+    assert result["file_name"] == "upload.csv"
+    assert result["rows"] == 2
+    assert result["column_names"] == ["a", "b"]
+
+
+def test_file_like_cached_by_content_hash():
+    content = b"a,b\n1,2"
+
+    first = load_metadata(io.BytesIO(content), content_hash="abc", file_name="x.csv")
+    # Cùng hash -> lấy từ cache, không đọc lại nội dung
+    second = load_metadata(io.BytesIO(b""), content_hash="abc", file_name="x.csv")
+
+    assert first == second
+    assert second["rows"] == 1
+
+
 # =========================
 # EXCEL LOAD TEST
 # =========================
@@ -175,3 +574,35 @@ def test_excel_load():
     assert result["columns"] == 2
 
     os.unlink(temp.name)
+
+
+def test_excel_duplicate_keep_first():
+    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
+    temp.close()
+
+    df = pd.DataFrame([[1, 2, 3]], columns=["a", "b", "a"])
+    df.to_excel(temp.name, index=False)
+
+    loader = DataLoader(temp.name)
+    with pytest.raises(DuplicateColumnError):
+        loader.validate_and_load(action="check")
+
+    result = DataLoader(temp.name).validate_and_load(action="keep_first")
+    assert result["column_names"] == ["a", "b"]
+
+    os.unlink(temp.name)
+
+
+def test_excel_dot_suffix_column_is_not_duplicate():
+    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
+    temp.close()
+
+    df = pd.DataFrame({"a": [1, 2], "a.1": [3, 4]})
+    df.to_excel(temp.name, index=False)
+
+    loader = DataLoader(temp.name)
+    result = loader.validate_and_load(action="check")
+
+    assert result["column_names"] == ["a", "a.1"]
+
+    os.unlink(temp.name)
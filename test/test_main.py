@@ -0,0 +1,88 @@
+import asyncio
+import io
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from starlette.formparsers import MultiPartParser
+
+from src import main
+
+client = TestClient(main.app)
+
+
+# =========================
+# UPLOAD OK
+# =========================
+
+def test_upload_csv_success():
+    response = client.post("/upload/", files={"file": ("data.csv", b"a,b\n1,2\n3,4")})
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["file_name"] == "data.csv"
+    assert data["rows"] == 2
+    assert data["column_names"] == ["a", "b"]
+
+
+def test_upload_spilled_to_disk(monkeypatch):
+    # Spool nhỏ hơn file -> SpooledTemporaryFile ghi ra đĩa, DataLoader vẫn đọc được
+    monkeypatch.setattr(main, "SPOOL_MAX_BYTES", 4)
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_BYTES", 3)
+
+    response = client.post("/upload/", files={"file": ("data.csv", b"a,b\n1,2\n3,4\n5,6")})
+
+    assert response.status_code == 200
+    assert response.json()["data"]["rows"] == 3
+
+
+# =========================
+# UPLOAD ERRORS
+# =========================
+
+def test_upload_duplicate_columns():
+    response = client.post("/upload/?action=check", files={"file": ("data.csv", b"a,a\n1,2")})
+
+    assert response.status_code == 400
+    assert "Duplicate" in response.json()["detail"]
+
+
+def test_upload_too_large_rejected_early(monkeypatch):
+    # Giới hạn 10 byte; Content-Length vượt giới hạn -> chặn ở middleware, form không được parse
+    monkeypatch.setattr(main, "MAX_UPLOAD_MB", 10 / (1024 * 1024))
+    monkeypatch.setattr(main, "MULTIPART_OVERHEAD_BYTES", 0)
+
+    def fail_parse(self):
+        raise AssertionError("multipart form should not be parsed")
+
+    monkeypatch.setattr(MultiPartParser, "parse", fail_parse)
+
+    response = client.post("/upload/", files={"file": ("data.csv", b"a,b\n1,2\n3,4\n")})
+
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("File too large")
+
+
+def test_upload_within_limit_passes_middleware(monkeypatch):
+    # Body multipart lớn hơn file một chút vẫn được nhận nhờ MULTIPART_OVERHEAD_BYTES
+    content = b"a,b\n1,2\n3,4\n"
+    monkeypatch.setattr(main, "MAX_UPLOAD_MB", len(content) / (1024 * 1024))
+
+    response = client.post("/upload/", files={"file": ("data.csv", content)})
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("declared_size", [None, 1])
+def test_upload_too_large_while_streaming(monkeypatch, declared_size):
+    # Content-Length thiếu hoặc khai báo nhỏ hơn thực tế -> bị chặn khi đang đọc
+    monkeypatch.setattr(main, "MAX_UPLOAD_MB", 10 / (1024 * 1024))
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_BYTES", 4)
+    upload = UploadFile(file=io.BytesIO(b"a,b\n1,2\n3,4\n"), size=declared_size, filename="data.csv")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(main.upload_file(file=upload, action="check"))
+
+    assert exc_info.value.status_code == 413